@@ -1,12 +1,13 @@
 # app.py — Catalitium (Render-ready, gunicorn entrypoint: app:app)
-import os, csv, re, sqlite3, logging
+import os, sys, array, csv, gc, re, sqlite3, logging
 import contextlib
+import atexit, bisect, collections, functools, threading
 try:
     import psycopg  # psycopg v3
 except Exception:
     psycopg = None  # optional, only required when SUPABASE_URL is set
 from datetime import datetime, timezone
-from flask import Flask, render_template, request, redirect, url_for, flash, g, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, g, jsonify, make_response, session
 import hashlib, uuid
 
 # ------------------------- Config --------------------------------------------
@@ -49,9 +50,18 @@ DATA_ENC_KEY = os.getenv("DATA_ENC_KEY", "").strip()  # base64 urlsafe key for F
 # Require explicit env paths; avoid shipping sensitive CSVs by default
 JOBS_CSV    = os.getenv("JOBS_CSV",    "").strip()
 SALARY_CSV  = os.getenv("SALARY_CSV",  "").strip()
+# jobs CSV delimiter: TAB by default (env accepts "tab" or a literal \t); sniffing is opt-in
+JOBS_CSV_DELIM = os.getenv("JOBS_CSV_DELIM", "\t")
+if JOBS_CSV_DELIM.lower() in ("tab", "\\t"):
+    JOBS_CSV_DELIM = "\t"
+JOBS_CSV_SNIFF = os.getenv("JOBS_CSV_SNIFF", "0").strip() in ("1", "true", "yes")
+CATALITIUM_WARMUP = os.getenv("CATALITIUM_WARMUP", "1").strip() in ("1", "true", "yes")
 SECRET_KEY  = os.getenv("SECRET_KEY",  "").strip()
 GTM_ID      = os.getenv("GTM_CONTAINER_ID", "GTM-MNJ9SSL9")
 PER_PAGE_MAX = 100  # safety cap
+SEARCH_LOG_BATCH = 128  # buffered search_logs rows flushed in one transaction
+SEARCH_LOG_FLUSH_SEC = float(os.getenv("SEARCH_LOG_FLUSH_SEC", "5"))
+TOKEN_CACHE_MAX = 4096  # memoized query-token lookups per search index
 
 app = Flask(__name__, template_folder="templates")
 app.config.update(
@@ -98,10 +108,16 @@ def get_db():
         g.db = _pg_connect()
         return g.db
     # default: sqlite
-    g.db = sqlite3.connect(app.config["DB_PATH"])
-    g.db.row_factory = sqlite3.Row
+    g.db = _sqlite_connect(app.config["DB_PATH"])
     return g.db
 
+def _sqlite_connect(path):
+    conn = sqlite3.connect(path)
+    # per-connection settings; journal_mode=WAL is persistent and set once in init_db
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
 @app.teardown_appcontext
 def close_db(_e=None):
     db = g.pop("db", None)
@@ -239,17 +255,18 @@ def init_db():
     );
     CREATE INDEX IF NOT EXISTS idx_subscribe_created ON subscribe_events(created_at);
     """
+    # WAL: readers don't block on the writer, and commits fsync far less often
+    db.execute("PRAGMA journal_mode=WAL")
     db.executescript(schema)
     db.commit()
 
-_db_inited_once = False
+# Create the schema once at import (once per worker, or once in the master
+# with gunicorn --preload) rather than checking on the request path.
+with app.app_context():
+    init_db()
 
 @app.before_request
-def _ensure_db():
-    global _db_inited_once
-    if not _db_inited_once:
-        init_db()
-        _db_inited_once = True
+def _ensure_session():
     # ensure session id cookie exists (prepare in g; cookie set in after_request)
     _ensure_sid()
 
@@ -283,16 +300,15 @@ def _apply_sid_cookie(r):
 
 def log_search_event(raw_title, raw_country, norm_title, norm_country, sal_floor, sal_ceiling, result_count, page, per_page):
     ua, ref, ip_h, sid = _client_meta()
-    db = get_db()
     if app.config["DB_BACKEND"] == "postgres":
+        db = get_db()
         with db.cursor() as cur:
             cur.execute(
                 'INSERT INTO search_events(created_at,raw_title,raw_country,norm_title,norm_country,sal_floor,sal_ceiling,result_count,page,per_page,user_agent,referer,ip_hash,session_id) VALUES(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)',
                 (_now_iso(), raw_title or '', raw_country or '', norm_title or '', norm_country or '', sal_floor, sal_ceiling, result_count, page, per_page, ua[:300], ref[:300], ip_h, sid)
             )
         return
-    db.execute('INSERT INTO search_events(created_at,raw_title,raw_country,norm_title,norm_country,sal_floor,sal_ceiling,result_count,page,per_page,user_agent,referer,ip_hash,session_id) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)', (_now_iso(), raw_title or '', raw_country or '', norm_title or '', norm_country or '', sal_floor, sal_ceiling, result_count, page, per_page, ua[:300], ref[:300], ip_h, sid))
-    db.commit()
+    _buffer_write('INSERT INTO search_events(created_at,raw_title,raw_country,norm_title,norm_country,sal_floor,sal_ceiling,result_count,page,per_page,user_agent,referer,ip_hash,session_id) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)', (_now_iso(), raw_title or '', raw_country or '', norm_title or '', norm_country or '', sal_floor, sal_ceiling, result_count, page, per_page, ua[:300], ref[:300], ip_h, sid))
 
 def log_job_view_event(job_id, job_title, company, location, norm_country):
     ua, ref, ip_h, sid = _client_meta()
@@ -313,16 +329,26 @@ def _now_iso():
 
 # _valid_email replaced by email_validator library in /subscribe
 
-def _tokens(text: str):
-    return [t for t in re.split(r"[^\w+]+", text.lower()) if t]
+# Precompiled patterns (hot path: per row at CSV load, per request in filters)
+_RE_MONEY = re.compile(r"(\d[\d,.\s]*)(k?)", re.I)  # (digits, optional 'k')
+_RE_RANGE = re.compile(r"(\d[\d,.\s]*k?)\s*[-–]\s*(\d[\d,.\s]*k?)", re.I)
+_RE_GTE = re.compile(r">\s*=?\s*(\d[\d,.\s]*k?)", re.I)
+_RE_LTE = re.compile(r"<\s*=?\s*(\d[\d,.\s]*k?)", re.I)
+_RE_NUM = re.compile(r"(\d[\d,.\s]*k?)", re.I)
+# money cleanup in one pass: drop ',' and whitespace
+_MONEY_TBL = str.maketrans("", "", ", \t\n\r\f\v")
+_MONEY_DOTS = str.maketrans("", "", ".")
+# runs of punctuation and/or whitespace collapse to a single space
+_RE_NORM = re.compile(r"(?:[^\w\s\-\/]|\s)+")
+# same mapping for ASCII input as one translate table (punctuation -> space)
+_NORM_ASCII = str.maketrans({c: " " for c in map(chr, range(128))
+                             if not (c.isalnum() or c.isspace() or c in "_-/")})
+# location punctuation -> space, so str.split() yields the words of a location
+_LOC_SEPS = str.maketrans({c: " " for c in ",;:()[]{}|/\\-–·"})
+_RE_TOKENS = re.compile(r"[\w+]+")
 
-def _fuzzy_match(needle: str, hay: str) -> bool:
-    """Loose containment check for tokens (case insensitive)."""
-    if not needle:
-        return True
-    n_tokens = _tokens(needle)
-    hay_l = hay.lower()
-    return all(tok in hay_l for tok in n_tokens)
+def _tokens(text: str):
+    return _RE_TOKENS.findall(text.lower())
 
 # ------------------------- Normalization dictionaries ------------------------
 COUNTRY_NORM = {
@@ -346,52 +372,79 @@ TITLE_SYNONYMS = {
     "sre":"site reliability engineer","devops":"devops","sec eng":"security engineer","infosec":"security",
 }
 
+# Whole-word alias alternation, longest first ("united states" before "us").
+_COUNTRY_RE = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, COUNTRY_NORM), key=len, reverse=True)) + r")\b"
+)
+
+@functools.lru_cache(maxsize=4096)
 def normalize_country(q: str) -> str:
     """Return normalized country code if possible."""
     if not q:
         return ""
     t = q.strip().lower()
-    if t in COUNTRY_NORM:
-        return COUNTRY_NORM[t]
+    code = COUNTRY_NORM.get(t)
+    if code:
+        return code
     if len(t) == 2 and t.isalpha():
         return t.upper()
-    for token, code in COUNTRY_NORM.items():
-        if token in t:
-            return code
+    m = _COUNTRY_RE.search(t)
+    if m:
+        return COUNTRY_NORM[m.group(1)]
     return q.strip()
 
+@functools.lru_cache(maxsize=4096)
 def extract_country_code(loc: str, country_fallback: str = "") -> str:
     """Try to extract country code from location string or fallback country."""
     if loc:
-        parts = re.split(r"[^A-Za-z0-9]+", loc)
-        for token in reversed([p for p in parts if p]):
-            t = token.lower()
-            if t in COUNTRY_NORM:
-                return COUNTRY_NORM[t]
+        # country is almost always the last word: one translate + split, scanned right to left
+        for token in reversed(loc.translate(_LOC_SEPS).split()):
+            t = token.strip(".'\"").lower()
+            if not t:
+                continue
+            code = COUNTRY_NORM.get(t)
+            if code:
+                return code
             if len(t) == 2 and t.isalpha():
                 return t.upper()
     return normalize_country(country_fallback)
 
+# Whole-word synonym alternation, longest first so "front-end" wins over shorter keys.
+_SYN_RE = re.compile(
+    r"\b(" + "|".join(re.escape(k) for k in sorted(TITLE_SYNONYMS, key=len, reverse=True)) + r")\b",
+    re.I,
+)
+
+@functools.lru_cache(maxsize=4096)
 def normalize_title(q: str) -> str:
     if not q:
         return ""
     s = q.lower()
-    for k, v in TITLE_SYNONYMS.items():
-        if k in s:
-            s = s.replace(k, v)
-    s = re.sub(r"[^\w\s\-\/]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    if s.isascii():
+        s = " ".join(s.translate(_NORM_ASCII).split())
+    else:
+        s = _RE_NORM.sub(" ", s).strip()
+    # synonyms after cleanup, so "sw.eng" / "software   eng" still match and
+    # the result is a fixed point (normalize_title(normalize_title(q)) == ...)
+    return _SYN_RE.sub(lambda m: TITLE_SYNONYMS[m.group(1).lower()], s)
 
 # ------------------------- Salary parsing ------------------------------------
 def parse_money_numbers(text: str):
     if not text:
         return []
     nums = []
-    for raw in re.findall(r'(?i)\d[\d,.\s]*k?', text):
-        clean = raw.lower().replace(",", "").replace(" ", "")
-        mult = 1000 if clean.endswith("k") else 1
-        clean = clean.rstrip("k").replace(".", "")
+    for digits, k in _RE_MONEY.findall(text):
+        mult = 1000 if k else 1
+        clean = digits.translate(_MONEY_TBL).rstrip(".")
+        if "." in clean:
+            # '.' followed by 3-digit groups is a thousands separator (120.000),
+            # anything else is a decimal point (90.5k)
+            whole, _, frac = clean.partition(".")
+            if not all(len(p) == 3 for p in frac.split(".")):
+                if whole.isdigit() and frac.isdigit():
+                    nums.append(int(round(float(f"{whole}.{frac}") * mult)))
+                continue
+            clean = clean.translate(_MONEY_DOTS)
         if clean.isdigit():
             nums.append(int(clean) * mult)
     return nums
@@ -402,6 +455,7 @@ def parse_salary_range_from_text(text: str):
         return (None, None)
     return (min(nums), max(nums) if len(nums) > 1 else None)
 
+@functools.lru_cache(maxsize=4096)
 def parse_salary_query(q: str):
     """Parse inline salary filters like '80k-120k', '>100k', '<=90k', '120k'."""
     if not q:
@@ -409,26 +463,26 @@ def parse_salary_query(q: str):
     s = q.strip()
 
     # Range (80k-120k)
-    m = re.search(r'(?i)(\d[\d,.\s]*k?)\s*[-–]\s*(\d[\d,.\s]*k?)', s)
+    m = _RE_RANGE.search(s)
     if m:
         low = parse_money_numbers(m.group(1))
         high = parse_money_numbers(m.group(2))
         return (s[:m.start()] + s[m.end():]).strip(), low[0] if low else None, high[-1] if high else None
 
     # Greater than
-    m = re.search(r'(?i)>\s*=?\s*(\d[\d,.\s]*k?)', s)
+    m = _RE_GTE.search(s)
     if m:
         v = parse_money_numbers(m.group(1))
         return (s[:m.start()] + s[m.end():]).strip(), v[0] if v else None, None
 
     # Less than
-    m = re.search(r'(?i)<\s*=?\s*(\d[\d,.\s]*k?)', s)
+    m = _RE_LTE.search(s)
     if m:
         v = parse_money_numbers(m.group(1))
         return (s[:m.start()] + s[m.end():]).strip(), None, v[0] if v else None
 
     # Single number
-    m = re.search(r'(?i)(\d[\d,.\s]*k?)', s)
+    m = _RE_NUM.search(s)
     if m:
         v = parse_money_numbers(m.group(1))
         return (s[:m.start()] + s[m.end():]).strip(), v[0] if v else None, None
@@ -436,18 +490,40 @@ def parse_salary_query(q: str):
     return (s, None, None)
 
 # ------------------------- CSV helpers ---------------------------------------
-def _sniff_reader(fp, default_delim="\t"):
+def _sniff_delimiter(fp, default_delim="\t"):
     sample = fp.read(4096)
     fp.seek(0)
     try:
-        dialect = csv.Sniffer().sniff(sample, delimiters="\t,;|")
+        return csv.Sniffer().sniff(sample, delimiters="\t,;|").delimiter
     except Exception:
-        class _D: delimiter = default_delim
-        dialect = _D()
-    return csv.DictReader(fp, dialect=dialect)
+        return default_delim
+
+def _jobs_reader(fp):
+    """Return ({column: index}, csv.reader) for the jobs file, header consumed.
+
+    Uses JOBS_CSV_DELIM (retrying with ',' when the header doesn't split), or
+    csv.Sniffer when JOBS_CSV_SNIFF is set.
+    """
+    delim = _sniff_delimiter(fp, JOBS_CSV_DELIM) if JOBS_CSV_SNIFF else JOBS_CSV_DELIM
+    reader = csv.reader(fp, delimiter=delim)
+    header = next(reader, [])
+    if len(header) <= 1 and delim != ",":
+        fp.seek(0)
+        reader = csv.reader(fp, delimiter=",")
+        header = next(reader, [])
+    # later duplicates win, as with csv.DictReader
+    return {name: i for i, name in enumerate(header)}, reader
+
+def _csv_field(row, idxs):
+    """First non-empty value among the column indexes idxs ('' for short rows)."""
+    n = len(row)
+    for i in idxs:
+        if i < n and row[i]:
+            return row[i]
+    return ""
 
 # ------------------------- Salary reference cache ----------------------------
-_salary_cache = {"path": None, "mtime": 0, "map": {}}
+_salary_cache = {"path": None, "mtime": 0, "size": 0, "digest": None, "map": {}}
 
 def _maybe_decrypt_bytes(data: bytes) -> bytes:
     if not DATA_ENC_KEY:
@@ -469,14 +545,34 @@ def _open_csv_maybe_encrypted(path: str, encrypted_flag: bool):
     dec = _maybe_decrypt_bytes(raw)
     return io.BytesIO(dec)
 
+def _file_digest(path: str) -> str:
+    """Content hash of a file; lets a touched/re-synced but unchanged CSV keep its cache."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 def read_salary_reference():
+    """Salary reference cache entry: {"map": {(city|None, country): ref}, "digest": ..., ...}."""
+    global _salary_cache
     path = SALARY_CSV
-    if not os.path.exists(path):
-        return {}
-
-    mtime = os.path.getmtime(path)
-    if _salary_cache["path"] == path and _salary_cache["mtime"] == mtime:
-        return _salary_cache["map"]
+    try:
+        st = os.stat(path)
+    except OSError:
+        # drop the entry too: the ETag is keyed on it and must change with the data
+        _salary_cache = {"path": None, "mtime": 0, "size": 0, "digest": None, "map": {}}
+        return _salary_cache
+
+    # nanosecond mtime + size, as for the jobs CSV; on a stat change the content
+    # hash decides, so the same map object (and the jobs keyed on it) survives a touch
+    cache = _salary_cache
+    if cache["path"] == path and cache["mtime"] == st.st_mtime_ns and cache["size"] == st.st_size:
+        return cache
+    digest = _file_digest(path)
+    if cache["path"] == path and cache["digest"] == digest:
+        _salary_cache = {**cache, "mtime": st.st_mtime_ns, "size": st.st_size}
+        return _salary_cache
 
     ref = {}
     # Support optional encryption; decode to text for csv
@@ -484,6 +580,7 @@ def read_salary_reference():
     import io
     text_stream = io.TextIOWrapper(fobj, encoding="utf-8", errors="replace")
     with text_stream as f:
+        # delimiter follows the extension (.tsv/.tab -> TAB, else ','); never sniffed
         reader = csv.DictReader(f, delimiter="\t" if path.lower().endswith((".tsv", ".tab")) else ",")
         for row in reader:
             city = (row.get("City") or "").strip().lower()
@@ -511,78 +608,195 @@ def read_salary_reference():
             }
             ref.setdefault(key_country, ref[key_city])
 
-    _salary_cache.update({"path": path, "mtime": mtime, "map": ref})
-    return ref
-
-def enrich_with_salary_reference(rows):
-    ref_map = read_salary_reference()
-    if not ref_map:
-        return rows
-
-    for j in rows:
-        city = (j.get("City") or "").strip().lower()
-        country = (j.get("Country") or "").strip().lower()
-        ref = ref_map.get((city, country)) or ref_map.get((None, country))
-        if ref:
-            j.update({
-                "ref_median": ref["median"],
-                "ref_min": ref["min"],
-                "ref_currency": ref["currency"],
-                "ref_match_label": ref["label"],
-                "ref_salary_min": ref["min"],
-                "ref_salary_max": ref["median"],
-            })
-    return rows
+    _salary_cache = {"path": path, "mtime": st.st_mtime_ns, "size": st.st_size, "digest": digest, "map": ref}
+    return _salary_cache
+
+def _salary_ref_fields(ref_map, city, country):
+    """Salary reference columns for one job location, or None when unmatched."""
+    city, country = (city or "").strip().lower(), (country or "").strip().lower()
+    ref = ref_map.get((city, country)) or ref_map.get((None, country))
+    if not ref:
+        return None
+    return {
+        "ref_median": ref["median"],
+        "ref_min": ref["min"],
+        "ref_currency": ref["currency"],
+        "ref_match_label": ref["label"],
+        "ref_salary_min": ref["min"],
+        "ref_salary_max": ref["median"],
+    }
 
 # ------------------------- Jobs CSV with cache -------------------------------
-_jobs_cache = {"path": None, "mtime": 0, "rows": []}
+_jobs_cache = {"path": None, "mtime": 0, "size": 0, "digest": None, "ref": None, "ref_digest": None, "rows": []}
 
 def read_jobs_csv():
-    path = JOBS_CSV
-    if not os.path.exists(path):
-        return []
+    """Cache entry of the jobs joined with the salary reference; rebuilt only when either CSV changes.
 
-    mtime = os.path.getmtime(path)
-    if _jobs_cache["path"] == path and _jobs_cache["mtime"] == mtime:
-        return _jobs_cache["rows"]
+    entry["rows"] is shared between requests and must not be mutated. entry["digest"]
+    and entry["ref_digest"] identify exactly the data those rows were built from.
+    """
+    global _jobs_cache
+    path = JOBS_CSV
+    try:
+        st = os.stat(path)
+    except OSError:
+        # drop the entry too: the ETag is keyed on it and must change with the data
+        _jobs_cache = {"path": None, "mtime": 0, "size": 0, "digest": None, "ref": None, "ref_digest": None, "rows": []}
+        return _jobs_cache
+
+    # salary reference is joined in during the same pass, so a new reference map
+    # (cached by read_salary_reference) invalidates too; without one {} comes back
+    # fresh on every call, so that case is keyed as None
+    salary = read_salary_reference()
+    ref_map = salary["map"] or None
+    ref_digest = salary["digest"] if ref_map else None
+
+    # nanosecond mtime + size: a same-second rewrite still invalidates; when they
+    # change, hashing the file (milliseconds) is still far cheaper than a reparse
+    # and skips it for deploys that only touch or re-sync the CSV
+    cache = _jobs_cache
+    same_src = cache["path"] == path and cache["ref"] is ref_map
+    if same_src and cache["mtime"] == st.st_mtime_ns and cache["size"] == st.st_size:
+        return cache
+    digest = _file_digest(path)
+    if same_src and cache["digest"] == digest:
+        _jobs_cache = {**cache, "mtime": st.st_mtime_ns, "size": st.st_size}
+        return _jobs_cache
 
     jobs = []
     fobj = _open_csv_maybe_encrypted(path, JOBS_ENCRYPTED)
     import io
     text_stream = io.TextIOWrapper(fobj, encoding="utf-8", errors="replace")
     with text_stream as f:
-        reader = _sniff_reader(f, default_delim="\t")
-        for i, row in enumerate(reader, start=1):
-            title = (row.get("JobTitle") or row.get("Title") or "").strip()
-            company = (row.get("CompanyName") or row.get("Company") or "").strip()
-            city = (row.get("City") or "").strip()
-            country_raw = (row.get("Country") or "").strip()
-            location = (row.get("Location") or "").strip() or ", ".join([p for p in [city, country_raw] if p]) or "Remote"
-            desc = (row.get("Description") or row.get("Summary") or row.get("NormalizedJob") or "").strip() or title
-            date_posted = (row.get("CreatedAt") or row.get("DatePosted") or "").strip()
-            salary_text = (row.get("Salary") or "").strip()
-            smin, smax = parse_salary_range_from_text(salary_text)
+        cols, reader = _jobs_reader(f)
+        # resolve column names to indexes once instead of hashing names per row
+        def idx(*names):
+            return tuple(cols[n] for n in names if n in cols)
+        c_id, c_title, c_company = idx("JobID", "Id"), idx("JobTitle", "Title"), idx("CompanyName", "Company")
+        c_city, c_country, c_location = idx("City"), idx("Country"), idx("Location")
+        c_desc = idx("Description", "Summary", "NormalizedJob")
+        c_date, c_salary = idx("CreatedAt", "DatePosted"), idx("Salary")
+        salary_ranges = {"": (None, None)}  # few distinct salary strings per file; parse each once
+        places = {}  # (Location, City, Country) -> interned (location, city, country, code, salary ref)
+        i = 0
+        for row in reader:
+            if not row:
+                continue  # blank line (csv.DictReader skipped these too)
+            i += 1
+            title = _csv_field(row, c_title).strip()
+            # company and description (NormalizedJob) repeat a lot; share one string per value
+            company = sys.intern(_csv_field(row, c_company).strip())
+            place_key = (_csv_field(row, c_location), _csv_field(row, c_city), _csv_field(row, c_country))
+            place = places.get(place_key)
+            if place is None:
+                loc_raw, city, country_raw = (sys.intern(p.strip()) for p in place_key)
+                location = loc_raw or ", ".join([p for p in [city, country_raw] if p]) or "Remote"
+                code = extract_country_code(location, country_raw) or ""
+                ref = _salary_ref_fields(ref_map, city, country_raw) if ref_map else None
+                place = places[place_key] = (sys.intern(location), city, country_raw, sys.intern(code), ref)
+            location, city, country_raw, code, ref = place
+            desc = sys.intern(_csv_field(row, c_desc).strip() or title)
+            date_posted = _csv_field(row, c_date).strip()
+            salary_text = _csv_field(row, c_salary).strip()
+            rng = salary_ranges.get(salary_text)
+            if rng is None:
+                rng = salary_ranges[salary_text] = parse_salary_range_from_text(salary_text)
+            smin, smax = rng
 
             if not title and not company:
                 continue
+            title, company = title or "(Untitled)", company or "—"
 
-            code = extract_country_code(location, country_raw)
-            jobs.append({
-                "id": (row.get("JobID") or row.get("Id") or str(i)).strip(),
-                "title": title or "(Untitled)",
-                "company": company or "—",
+            job = {
+                "id": (_csv_field(row, c_id) or str(i)).strip(),
+                "title": title,
+                "company": company,
                 "location": location,
                 "description": desc,
                 "date_posted": date_posted[:10] if date_posted else "",
                 "salary_min": smin,
                 "salary_max": smax,
-                "country_code": code or "",
+                "country_code": code,
                 "City": city,
                 "Country": country_raw,
-            })
+            }
+            if ref:
+                job.update(ref)
+            jobs.append(job)
+
+    # replaced, not updated, so concurrent readers never see a half-written entry
+    _jobs_cache = {"path": path, "mtime": st.st_mtime_ns, "size": st.st_size, "digest": digest,
+                   "ref": ref_map, "ref_digest": ref_digest, "rows": jobs}
+    return _jobs_cache
+
+# ------------------------- Search index --------------------------------------
+# Column (struct-of-arrays) view of the cached rows holding only what the
+# filter reads, so the scan never touches the row dicts it doesn't yield.
+# Swapped in as a whole whenever the cached rows list is replaced.
+_search_index = None
+
+def _build_search_index(rows):
+    postings = {}            # token -> positions of rows whose title/company/description contain it
+    # dictionary-encoded location column: distinct lowercased locations + one code per row
+    loc_values, loc_codes, loc_ids = [], {}, array.array("I")
+    sal_lo, sal_hi = [], []  # effective salary bounds per row (None: no salary known)
+    for i, r in enumerate(rows):
+        # search text is built here, once per load, instead of being kept on every row
+        for tok in set(_tokens(f"{r['title']} {r['company']} {r['description']}")):
+            postings.setdefault(tok, set()).add(i)
+        k = loc_codes.get(r["location"])
+        if k is None:
+            k = loc_codes[r["location"]] = len(loc_values)
+            loc_values.append(r["location"].lower())
+        loc_ids.append(k)
+        jmin, jmax = job_effective_salary_range(r)
+        if jmin is None and jmax is None:
+            sal_lo.append(None)
+            sal_hi.append(None)
+        else:
+            sal_lo.append(jmin or 0)
+            sal_hi.append(jmax or jmin or 0)
+    # all indexed terms in one "\n"-joined string (tokens never contain "\n"), so
+    # substring lookups are a C-level str.find instead of a Python loop over terms
+    terms = list(postings)
+    term_starts, pos = [], 0
+    for t in terms:
+        term_starts.append(pos)
+        pos += len(t) + 1
+    return {
+        "rows": rows, "postings": postings, "sal_lo": sal_lo, "sal_hi": sal_hi,
+        "loc_values": loc_values, "loc_ids": loc_ids,
+        "terms": terms, "term_starts": term_starts, "vocab": "\n".join(terms),
+        "token_cache": {},  # query token -> frozenset of row positions
+    }
 
-    _jobs_cache.update({"path": path, "mtime": mtime, "rows": jobs})
-    return jobs
+def _get_search_index(rows):
+    global _search_index
+    idx = _search_index
+    if idx is None or idx["rows"] is not rows:
+        idx = _search_index = _build_search_index(rows)
+    return idx
+
+def _token_rowids(idx, tok):
+    """Rows containing tok. Query tokens match inside indexed tokens, like the old substring scan."""
+    cache = idx["token_cache"]
+    ids = cache.get(tok)
+    if ids is not None:
+        return ids
+    postings, terms, starts, vocab = idx["postings"], idx["terms"], idx["term_starts"], idx["vocab"]
+    ids = set()
+    pos = vocab.find(tok)
+    while pos >= 0:
+        k = bisect.bisect_right(starts, pos) - 1
+        ids |= postings[terms[k]]
+        if k + 1 == len(starts):
+            break
+        pos = vocab.find(tok, starts[k + 1])  # next term; one hit per term is enough
+    # query tokens repeat across requests; the cache lives and dies with this index
+    if len(cache) >= TOKEN_CACHE_MAX:
+        cache.clear()
+    ids = cache[tok] = frozenset(ids)
+    return ids
 
 # ------------------------- Filtering / Pagination ----------------------------
 def job_effective_salary_range(j):
@@ -591,51 +805,149 @@ def job_effective_salary_range(j):
         j.get("salary_max") or j.get("ref_salary_max"),
     )
 
-def filter_jobs(rows, title_q, country_q, sal_min_req=None, sal_max_req=None):
-    tq = normalize_title(title_q or "")
-    cq = normalize_country(country_q or "")
-    out = []
-    for r in rows:
-        text = f"{r['title']} {r['company']} {r['description']}"
-        ok = True
-        if tq and not _fuzzy_match(tq, text): ok = False
-        if ok and cq and cq.lower() not in r["location"].lower(): ok = False
-        if ok and (sal_min_req is not None or sal_max_req is not None):
-            jmin, jmax = job_effective_salary_range(r)
-            if jmin is None and jmax is None: ok = False
-            else:
-                jmin = jmin or 0
-                jmax = jmax or jmin
-                if sal_min_req is not None and jmax < sal_min_req: ok = False
-                if sal_max_req is not None and jmin > sal_max_req: ok = False
-        if ok: out.append(r)
-    return out
+def _title_rowids(idx, tq):
+    """Positions of rows matching every token of the normalized title query (None = no title filter)."""
+    # tokenize the query once, not once per row
+    needle_tokens = tuple(_tokens(tq))
+    if not needle_tokens:
+        return None
+    matched = None
+    # intersect rarest-first so the working set shrinks as fast as possible
+    for ids in sorted((_token_rowids(idx, tok) for tok in needle_tokens), key=len):
+        matched = ids if matched is None else matched & ids
+        if not matched:
+            break
+    return matched
+
+def iter_filter_jobs(rows, title_q, country_q, sal_min_req=None, sal_max_req=None):
+    """Yield matching rows in CSV order; stops as soon as the caller stops consuming.
+
+    title_q / country_q are expected already passed through normalize_title /
+    normalize_country, as the routes do.
+    """
+    tq = title_q or ""
+    cq_l = (country_q or "").lower()
+    if not tq and not cq_l and sal_min_req is None and sal_max_req is None:
+        # no filter (plain homepage hit): rows as-is, no index lookups
+        yield from rows
+        return
+    idx = _get_search_index(rows)
+    ids = _title_rowids(idx, tq)
+    loc_ids, sal_lo, sal_hi = idx["loc_ids"], idx["sal_lo"], idx["sal_hi"]
+    loc_ok = None
+    if cq_l:
+        # substring test once per distinct location, then a set lookup per row
+        loc_ok = {k for k, loc in enumerate(idx["loc_values"]) if cq_l in loc}
+        if not loc_ok:
+            return
+    by_salary = sal_min_req is not None or sal_max_req is not None
+    for i in (range(len(rows)) if ids is None else sorted(ids)):
+        if loc_ok is not None and loc_ids[i] not in loc_ok: continue
+        if by_salary:
+            jmin = sal_lo[i]
+            if jmin is None: continue
+            if sal_min_req is not None and sal_hi[i] < sal_min_req: continue
+            if sal_max_req is not None and jmin > sal_max_req: continue
+        yield rows[i]
+
+def count_matches(rows, title_q, country_q, sal_min_req=None, sal_max_req=None):
+    """Number of iter_filter_jobs matches, without materializing them."""
+    if not country_q and sal_min_req is None and sal_max_req is None:
+        if not title_q:
+            return len(rows)
+        # title-only filter: the posting intersection size is the answer
+        ids = _title_rowids(_get_search_index(rows), title_q)
+        return len(rows) if ids is None else len(ids)
+    return sum(1 for _ in iter_filter_jobs(rows, title_q, country_q, sal_min_req, sal_max_req))
+
+def filter_page(rows, title_q, country_q, sal_min_req=None, sal_max_req=None, start=0, end=None):
+    """(matches[start:end], total match count) from a single filter pass."""
+    if not country_q and sal_min_req is None and sal_max_req is None:
+        # title-only (or no) filter: the matching positions are resolved once; their
+        # count is the total and only the requested slice becomes rows
+        ids = _title_rowids(_get_search_index(rows), title_q) if title_q else None
+        if ids is None:
+            return rows[start:end], len(rows)
+        return [rows[i] for i in sorted(ids)[start:end]], len(ids)
+    page, total = [], 0
+    for total, r in enumerate(iter_filter_jobs(rows, title_q, country_q, sal_min_req, sal_max_req), 1):
+        if start < total and (end is None or total <= end):
+            page.append(r)
+    return page, total
+
+# SQLite search analytics (search_logs, search_events) are buffered and written
+# in batches (every SEARCH_LOG_BATCH rows or SEARCH_LOG_FLUSH_SEC seconds, and
+# at exit), so the search route itself never waits on a commit.
+_search_log_buf = collections.deque()  # (sql, params)
+_search_log_lock = threading.Lock()
+_search_log_timer = None
+
+def _buffer_write(sql, params):
+    global _search_log_timer
+    with _search_log_lock:
+        _search_log_buf.append((sql, params))
+        full = len(_search_log_buf) >= SEARCH_LOG_BATCH
+        if not full and _search_log_timer is None:
+            _search_log_timer = threading.Timer(SEARCH_LOG_FLUSH_SEC, flush_search_logs)
+            _search_log_timer.daemon = True
+            _search_log_timer.start()
+    if full:
+        flush_search_logs()
+
+def flush_search_logs():
+    global _search_log_timer
+    with _search_log_lock:
+        if _search_log_timer is not None:
+            _search_log_timer.cancel()
+            _search_log_timer = None
+        if not _search_log_buf:
+            return
+        batch = list(_search_log_buf)
+        _search_log_buf.clear()
+    by_sql = {}
+    for sql, params in batch:
+        by_sql.setdefault(sql, []).append(params)
+    conn = None
+    try:
+        conn = _sqlite_connect(app.config["DB_PATH"])
+        with conn:
+            for sql, rows in by_sql.items():
+                conn.executemany(sql, rows)
+    except sqlite3.Error as e:
+        logger.warning("search log flush failed (%d rows dropped): %s", len(batch), e)
+    finally:
+        if conn is not None:
+            conn.close()
+
+atexit.register(flush_search_logs)
 
 def log_search(term, country):
     if not term and not country:
         return
-    db = get_db()
     if app.config["DB_BACKEND"] == "postgres":
+        db = get_db()
         with db.cursor() as cur:
             cur.execute(
                 "INSERT INTO search_logs(term, country, created_at) VALUES(%s, %s, %s)",
                 (term or "", country or "", _now_iso()),
             )
         return
-    db.execute(
+    _buffer_write(
         "INSERT INTO search_logs(term,country,created_at) VALUES(?,?,?)",
         (term or "", country or "", _now_iso()),
     )
-    db.commit()
 
-def paginate(items, page, per_page):
-    total = len(items)
+def page_window(page, per_page):
+    """Clamped (page, per_page) and the [start, end) slice of matches they select."""
     page = max(1, page)
     per_page = min(max(1, per_page), PER_PAGE_MAX)
-    start, end = (page - 1) * per_page, page * per_page
+    return page, per_page, (page - 1) * per_page, page * per_page
+
+def paginate(page_items, page, per_page, total):
+    """Pagination info for one already-sliced page (page/per_page from page_window)."""
     pages = (total + per_page - 1) // per_page
     return {
-        "items": items[start:end],
+        "items": page_items,
         "page": page,
         "per_page": per_page,
         "total": total,
@@ -644,6 +956,25 @@ def paginate(items, page, per_page):
         "has_next": page < pages,
     }
 
+# ------------------------- HTTP caching --------------------------------------
+# Code/template version for ETags: the same across workers, new on each deploy.
+_ETAG_SALT = str(max(
+    os.path.getmtime(p) for p in (
+        os.path.abspath(__file__),
+        os.path.join(BASE_DIR, "templates", "base.html"),
+        os.path.join(BASE_DIR, "templates", "index.html"),
+    ) if os.path.exists(p)
+))
+
+def _results_etag(jobs):
+    """ETag for the search page: same CSV data + same query string -> same HTML.
+
+    Keyed on the digests stored in the jobs cache entry the page is rendered
+    from (None for a missing file), never on whatever the globals hold by now.
+    """
+    key = f"{_ETAG_SALT}:{jobs['digest']}:{jobs['ref_digest']}:".encode() + request.query_string
+    return hashlib.blake2b(key, digest_size=16).hexdigest()
+
 # ------------------------- Routes --------------------------------------------
 @app.get("/")
 def index():
@@ -656,15 +987,32 @@ def index():
     title_q = normalize_title(cleaned_title)
     country_q = normalize_country(raw_country)
 
-    rows = enrich_with_salary_reference(read_jobs_csv())
-    filtered = filter_jobs(rows, title_q, country_q, sal_floor, sal_ceiling)
-    pg = paginate(filtered, page, per_page_req)
-
-    if raw_title or raw_country:
+    jobs = read_jobs_csv()
+    rows = jobs["rows"]
+    page_no, per_page, start, end = page_window(page, per_page_req)
+    logged = bool(raw_title or raw_country)
+
+    # Pages with pending flash messages are per-user; never answer those from cache.
+    etag = _results_etag(jobs) if "_flashes" not in session else None
+    not_modified = bool(etag) and request.if_none_match.contains(etag)
+    if not_modified:
+        # nothing is rendered; the search log still wants the match count
+        page_rows = None
+        total = count_matches(rows, title_q, country_q, sal_floor, sal_ceiling) if logged else 0
+    else:
+        # one filter pass yields both the visible slice and the total
+        page_rows, total = filter_page(rows, title_q, country_q, sal_floor, sal_ceiling, start, end)
+
+    if logged:
         log_search(raw_title, raw_country)
-        log_search_event(raw_title, raw_country, title_q, country_q, sal_floor, sal_ceiling, pg["total"], page, pg["per_page"])
-    for r in pg["items"]:
-        r.pop("country_code", None)
+        log_search_event(raw_title, raw_country, title_q, country_q, sal_floor, sal_ceiling, total, page, per_page)
+
+    if not_modified:
+        resp = make_response("", 304)
+        resp.set_etag(etag)
+        return resp
+
+    pg = paginate(page_rows, page_no, per_page, total)
 
     def _url(p):
         return url_for(
@@ -680,11 +1028,17 @@ def index():
         "next_url": _url(pg["page"] + 1) if pg["has_next"] else None,
     }
 
-    return render_template(
+    resp = make_response(render_template(
         "index.html",
         results=pg["items"], count=pg["total"],
         title_q=title_q, country_q=country_q, pagination=pagination,
-    )
+    ))
+    if etag:
+        resp.set_etag(etag)
+        # revalidate every time (a redirect after /subscribe must show its flash)
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+    return resp
 
 @app.post("/subscribe")
 @limiter.limit("5/minute; 50/hour")
@@ -726,20 +1080,18 @@ def subscribe():
             "INSERT INTO subscribers(email, created_at) VALUES(?, ?)",
             (email, _now_iso()),
         )
-        db.commit()
         flash("You're subscribed! 🎉", "success")
         db.execute(
             "INSERT INTO subscribe_events(created_at, email_hash, status) VALUES(?,?,?)",
             (_now_iso(), _hash(email), "subscribed"),
         )
-        db.commit()
     except sqlite3.IntegrityError:
         flash("You're already on the list. 👍", "success")
         db.execute(
             "INSERT INTO subscribe_events(created_at, email_hash, status) VALUES(?,?,?)",
             (_now_iso(), _hash(email), "duplicate"),
         )
-        db.commit()
+    db.commit()  # subscriber + event in one transaction
     return redirect(url_for("index"))
 
 @app.post('/events/job_view')
@@ -770,10 +1122,10 @@ def admin_metrics():
 def api_salary_insights():
     title_q = normalize_title((request.args.get("title") or "").strip())
     country_q = normalize_country((request.args.get("country") or "").strip())
-    rows = enrich_with_salary_reference(read_jobs_csv())
-    filtered = filter_jobs(rows, title_q, country_q)
+    rows = read_jobs_csv()["rows"]
+    matches, total = filter_page(rows, title_q, country_q, end=100)
     insights = []
-    for r in filtered[:100]:
+    for r in matches:
         ref_min = r.get("ref_salary_min")
         ref_max = r.get("ref_salary_max")
         smin = r.get("salary_min") or ref_min
@@ -788,19 +1140,32 @@ def api_salary_insights():
             "ref_currency": r.get("ref_currency"),
         })
     return jsonify({
-        "count": len(filtered),
+        "count": total,
         "items": insights,
         "meta": {"title": title_q, "country": country_q}
     })
 
+# Parse the CSVs and build the search index at import. Under
+# `gunicorn --preload` this runs once in the master and forked workers share
+# the data copy-on-write; gc.freeze keeps the collector from touching (and so
+# copying) those pages in every worker. Cached rows are never mutated.
+# CATALITIUM_WARMUP=0 defers this to the first request (e.g. for one-off scripts).
+if CATALITIUM_WARMUP:
+    try:
+        _get_search_index(read_jobs_csv()["rows"])
+        gc.freeze()
+    except Exception as e:
+        logger.warning("jobs cache warmup failed: %s", e)
+
 if __name__ == "__main__":
     # Background scheduler for refreshing salary reference cache
     try:
         scheduler = BackgroundScheduler(daemon=True)
         def refresh_salary_cache():
+            global _salary_cache
             try:
-                # Reset cache so next call reloads
-                _salary_cache.update({"path": None, "mtime": 0, "map": {}})
+                # Force a re-check on the next call; unchanged content keeps the cached map
+                _salary_cache = {**_salary_cache, "mtime": 0}
                 # Proactively warm cache
                 read_salary_reference()
             except Exception as e: